@@ -53,6 +53,9 @@ class SnowflakeCredentials(Credentials):
     retry_on_database_errors: bool = False
     retry_all: bool = False
     insecure_mode: Optional[bool] = False
+    # seconds to reuse each database's object listing across invocations;
+    # 0 disables persisting it
+    relations_cache_ttl: int = 0
 
     def __post_init__(self):
         if (
@@ -218,7 +221,7 @@ class SnowflakeConnectionManager(SQLConnectionManager):
                      'Please double check your profile and try again.')
                     .format(msg))
             else:
-                raise DatabaseException(msg)
+                raise DatabaseException(msg) from e
         except Exception as e:
             if isinstance(e, snowflake.connector.errors.Error):
                 logger.debug('Snowflake query id: {}'.format(e.sfqid))
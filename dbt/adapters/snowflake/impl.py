@@ -1,9 +1,22 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import as_completed
 from dataclasses import dataclass
-from typing import Mapping, Any, Optional, List, Union, Set, Tuple, Dict
+from functools import lru_cache
+from operator import itemgetter
+from typing import (
+    Mapping, Any, Optional, List, Union, Set, FrozenSet, Tuple, Dict
+)
+from weakref import WeakKeyDictionary
 
 import agate
 
-from dbt.adapters.base.impl import AdapterConfig
+from dbt.adapters.base.impl import AdapterConfig, _catalog_filter_schemas
+from dbt.adapters.cache import _CachedRelation
 from dbt.adapters.sql import SQLAdapter
 from dbt.adapters.sql.impl import (
     LIST_SCHEMAS_MACRO_NAME,
@@ -12,14 +25,77 @@ from dbt.adapters.sql.impl import (
 from dbt.adapters.snowflake import SnowflakeConnectionManager
 from dbt.adapters.snowflake import SnowflakeRelation
 from dbt.adapters.snowflake import SnowflakeColumn
+from dbt.adapters.snowflake.relation import SnowflakeQuotePolicy
+from dbt.clients.agate_helper import table_from_rows
 from dbt.contracts.graph.manifest import Manifest
+from dbt.events import AdapterLogger
 from dbt.exceptions import raise_compiler_error, RuntimeException, DatabaseException
-from dbt.utils import filter_null_values
-
-LIST_DATABASE_OBJECTS_MACRO_NAME = "snowflake__list_database_objects"
+from dbt.utils import executor
+
+LIST_DATABASE_OBJECTS_SQL_MACRO_NAME = "snowflake__get_list_database_objects_sql"
+RELATIONS_CACHE_TOKEN_MACRO_NAME = "snowflake__get_relations_cache_token"
+RELATIONS_CACHE_FILE_PREFIX = "relations_cache_"
+# beyond this many schemas, filtering a database listing on the server is no
+# longer worth the size of the filter
+MAX_FILTERED_SCHEMAS = 100
+
+# Listing every object in a database returns many small rows, which the
+# connector's defaults (tuned for large analytical results) download in a few
+# big chunks. Use the smallest chunk size snowflake allows and fetch more
+# chunks in parallel. Filtered listings are small enough not to need it.
+METADATA_SESSION_PARAMS = {
+    "client_result_chunk_size": 48,
+    "client_prefetch_threads": 8,
+}
+
+logger = AdapterLogger("Snowflake")
+
+# objects listed from snowflake come back with their exact names, so quote
+# everything
+_QUOTE_POLICY_ALL = SnowflakeQuotePolicy(database=True, schema=True, identifier=True)
+_LIST_RELATIONS_COLUMNS = ("database_name", "schema_name", "name", "kind")
+
+
+@lru_cache(maxsize=4096)
+def _snow_upper(name: str) -> str:
+    """Uppercase an identifier. The same few names get normalized over and
+    over, so the results are cached and interned, which also makes comparing
+    them cheap.
+    """
+    return sys.intern(name.upper())
+
+
+@lru_cache(maxsize=4096)
+def _snow_lower(name: str) -> str:
+    """Lowercase an identifier, like `_snow_upper`."""
+    return sys.intern(name.lower())
+
+
+# snowflake error codes for an object that doesn't exist or that the current
+# role can't see
+_MISSING_OBJECT_ERRNOS = frozenset({2003, 2043})
+
+
+def _is_missing_object_error(exc: DatabaseException, fallback_message: str) -> bool:
+    """Check whether the connector error behind `exc` says the object doesn't
+    exist, falling back to looking for `fallback_message` in its message if
+    there is no error code.
+    """
+    errno = getattr(exc.__cause__, "errno", None)
+    # the connector sets errno to -1 when snowflake gave no code
+    if errno not in (None, -1):
+        return errno in _MISSING_OBJECT_ERRNOS
+    return fallback_message in str(exc)
+
+
+# one of these is built for every model, so store its fields in slots where
+# dataclasses support it
+_CONFIG_DATACLASS_KWARGS: Dict[str, Any] = (
+    {"slots": True} if sys.version_info >= (3, 10) else {}
+)
 
 
-@dataclass
+@dataclass(**_CONFIG_DATACLASS_KWARGS)
 class SnowflakeConfig(AdapterConfig):
     transient: Optional[bool] = None
     cluster_by: Optional[Union[str, List[str]]] = None
@@ -38,6 +114,18 @@ class SnowflakeAdapter(SQLAdapter):
 
     AdapterSpecificConfigs = SnowflakeConfig
 
+    def __init__(self, config):
+        super().__init__(config)
+        # the warehouse each snowflake session is using, as far as we know.
+        # Only `_use_warehouse` changes it, so it is kept up to date there.
+        # Keyed weakly on the connector handle: dbt closes the session after
+        # every node and opens a new handle for the next one, so an entry
+        # can't outlive its session.
+        self._current_warehouse_by_handle: WeakKeyDictionary = WeakKeyDictionary()
+        self._current_warehouse_lock = threading.Lock()
+        # looked up for every model in pre_model_hook
+        self._default_warehouse: Optional[str] = config.credentials.warehouse
+
     @classmethod
     def date_function(cls):
         return "CURRENT_TIMESTAMP()"
@@ -47,40 +135,61 @@ class SnowflakeAdapter(SQLAdapter):
         cls, table: agate.Table, manifest: Manifest
     ) -> agate.Table:
         # On snowflake, users can set QUOTED_IDENTIFIERS_IGNORE_CASE, so force
-        # the column names to their lowercased forms.
-        lowered = table.rename(column_names=[c.lower() for c in table.column_names])
-        return super()._catalog_filter_table(lowered, manifest)
+        # the column names to their lowercased forms. The base implementation
+        # rebuilds the table from its rows to force database + schema to be
+        # strings, so do that here with the lowered names instead of paying
+        # for an extra copy with `table.rename` first.
+        lowered = table_from_rows(
+            table.rows,
+            [_snow_lower(c) for c in table.column_names],
+            text_only_columns=["table_database", "table_schema", "table_name"],
+        )
+        return lowered.where(_catalog_filter_schemas(manifest))
 
     def _make_match_kwargs(self, database, schema, identifier):
         quoting = self.config.quoting
-        if identifier is not None and quoting["identifier"] is False:
-            identifier = identifier.upper()
-
-        if schema is not None and quoting["schema"] is False:
-            schema = schema.upper()
-
-        if database is not None and quoting["database"] is False:
-            database = database.upper()
-
-        return filter_null_values(
-            {"identifier": identifier, "schema": schema, "database": database}
-        )
+        return {
+            key: _snow_upper(value) if quoting[key] is False else value
+            for key, value in (
+                ("identifier", identifier),
+                ("schema", schema),
+                ("database", database),
+            )
+            if value is not None
+        }
 
     def _get_warehouse(self) -> str:
-        _, table = self.execute("select current_warehouse() as warehouse", fetch=True)
-        if len(table) == 0 or len(table[0]) == 0:
-            # can this happen?
-            raise RuntimeException("Could not get current warehouse: no results")
-        return str(table[0][0])
+        handle = self.connections.get_thread_connection().handle
+        with self._current_warehouse_lock:
+            warehouse = self._current_warehouse_by_handle.get(handle)
+        if warehouse is not None:
+            return warehouse
+
+        if self._default_warehouse is not None:
+            # sessions are opened on the profile's warehouse
+            warehouse = self._default_warehouse
+        else:
+            _, table = self.execute(
+                "select current_warehouse() as warehouse", fetch=True
+            )
+            if len(table) == 0 or len(table[0]) == 0:
+                # can this happen?
+                raise RuntimeException("Could not get current warehouse: no results")
+            warehouse = str(table[0][0])
+        with self._current_warehouse_lock:
+            self._current_warehouse_by_handle[handle] = warehouse
+        return warehouse
 
     def _use_warehouse(self, warehouse: str):
         """Use the given warehouse. Quotes are never applied."""
         self.execute("use warehouse {}".format(warehouse))
+        handle = self.connections.get_thread_connection().handle
+        with self._current_warehouse_lock:
+            self._current_warehouse_by_handle[handle] = warehouse
 
     def pre_model_hook(self, config: Mapping[str, Any]) -> Optional[str]:
-        default_warehouse = self.config.credentials.warehouse
-        warehouse = config.get("snowflake_warehouse", default_warehouse)
-        if warehouse == default_warehouse or warehouse is None:
+        warehouse = config.get("snowflake_warehouse")
+        if warehouse is None or warehouse == self._default_warehouse:
             return None
         previous = self._get_warehouse()
         self._use_warehouse(warehouse)
@@ -112,7 +221,7 @@ class SnowflakeAdapter(SQLAdapter):
         try:
             return super().get_columns_in_relation(relation)
         except DatabaseException as exc:
-            if "does not exist or not authorized" in str(exc):
+            if _is_missing_object_error(exc, "does not exist or not authorized"):
                 return []
             else:
                 raise
@@ -127,30 +236,18 @@ class SnowflakeAdapter(SQLAdapter):
             # if the schema doesn't exist, we just want to return.
             # Alternatively, we could query the list of schemas before we start
             # and skip listing the missing ones, which sounds expensive.
-            if "Object does not exist" in str(exc):
+            if _is_missing_object_error(exc, "Object does not exist"):
                 return []
             raise
 
-        relations = []
-        quote_policy = {"database": True, "schema": True, "identifier": True}
-
-        columns = ["database_name", "schema_name", "name", "kind"]
-        for _database, _schema, _identifier, _type in results.select(columns):
-            try:
-                _type = self.Relation.get_relation_type(_type.lower())
-            except ValueError:
-                _type = self.Relation.External
-            relations.append(
-                self.Relation.create(
-                    database=_database,
-                    schema=_schema,
-                    identifier=_identifier,
-                    quote_policy=quote_policy,
-                    type=_type,
-                )
-            )
-
-        return relations
+        # pick the columns out of each row rather than `results.select`ing
+        # them, which would copy the whole table
+        get_fields = itemgetter(
+            *(results.column_names.index(c) for c in _LIST_RELATIONS_COLUMNS)
+        )
+        return self.Relation.bulk_create(
+            map(get_fields, results.rows), quote_policy=_QUOTE_POLICY_ALL
+        )
 
     def quote_seed_column(self, column: str, quote_config: Optional[bool]) -> str:
         quote_columns: bool = False
@@ -181,6 +278,7 @@ class SnowflakeAdapter(SQLAdapter):
         with self.cache.lock:
             if clear:
                 self.cache.clear()
+                self._remove_persisted_database_objects()
             self._relations_cache_for_schemas(manifest)
 
     def _relations_cache_for_schemas(self, manifest: Manifest) -> None:
@@ -189,49 +287,231 @@ class SnowflakeAdapter(SQLAdapter):
         """
         cache_schemas = self._get_cache_schemas(manifest)
         schema_databases: Set[str] = set()
-        cache_schema_names: Set[str] = set()
+        schema_names: Set[str] = set()
+        # it's possible that there were no relations in some schemas. We want
+        # to insert the schemas we query into the cache's `.schemas` attribute
+        # so we can check it later
+        cache_update: Set[Tuple[Optional[str], Optional[str]]] = set()
         for cache_schema in cache_schemas:
             schema_databases.add(cache_schema.database)
-            cache_schema_names.add(cache_schema.schema.lower())
-
-        for database in schema_databases:
-            try:
-                results = self.execute_macro(
-                    LIST_DATABASE_OBJECTS_MACRO_NAME, kwargs={"database": database}
+            schema_names.add(_snow_lower(cache_schema.schema))
+            cache_update.add((cache_schema.database, cache_schema.schema))
+        cache_schema_names: FrozenSet[str] = frozenset(schema_names)
+
+        # list each database on its own connection so the round trips overlap
+        with executor(self.config) as tpe:
+            futures = {
+                tpe.submit_connected(
+                    self,
+                    f"list_objects_{database}",
+                    self._list_database_objects,
+                    database,
+                    cache_schema_names,
+                ): database
+                for database in schema_databases
+            }
+            for future in as_completed(futures):
+                # if we can't read the objects we need to just raise anyway,
+                # so just call future.result() and let that raise on failure
+                relations = future.result()
+                database = futures[future]
+                logger.debug(
+                    f'Adding {len(relations)} relations in database "{database}" '
+                    f"to the cache"
                 )
-            except DatabaseException as exc:
-                msg = (
-                    f"Database error while listing objects in database "
-                    f'"{database}"\n{exc}'
+                self._add_relations_to_cache(relations)
+
+        self.cache.update_schemas(cache_update)
+
+    def _add_relations_to_cache(self, relations: List[SnowflakeRelation]) -> None:
+        """Add many relations to the cache at once. `RelationsCache.add` fires
+        its debug events, including dumps of the whole cache, for every
+        relation it adds, so go straight to the `_setdefault` it uses.
+        """
+        with self.cache.lock:
+            for relation in relations:
+                self.cache._setdefault(_CachedRelation(relation))
+
+    def _list_database_objects(
+        self, database: str, schema_names: FrozenSet[str]
+    ) -> List[SnowflakeRelation]:
+        """List the objects in the given database, returning relations for
+        those in any of the given (lowercased) schemas.
+
+        If `relations_cache_ttl` is set, the listing is saved to the target
+        directory and reused by later invocations until it expires or the
+        objects in the database change.
+        """
+        token = None
+        if self.config.credentials.relations_cache_ttl > 0:
+            token = self._get_relations_cache_token(database)
+        persisted = None
+        if token is not None:
+            persisted = self._load_persisted_database_objects(
+                database, token, schema_names
+            )
+
+        if persisted is not None:
+            objects = [obj for obj in objects if _snow_lower(obj[1]) in schema_names]
+        else:
+            objects = self._stream_database_objects(database, schema_names)
+            if token is not None:
+                self._persist_database_objects(database, token, schema_names, objects)
+
+        return self.Relation.bulk_create(objects, quote_policy=_QUOTE_POLICY_ALL)
+
+    def _stream_database_objects(
+        self, database: str, schema_names: FrozenSet[str]
+    ) -> List[Tuple[str, str, str, str]]:
+        """Return the (database, schema, name, kind) of each object in the
+        given database that is in any of the given (lowercased) schemas.
+
+        When there are few enough schemas, the listing is filtered to them
+        in snowflake, so only the objects we want come over the network.
+
+        Rows are consumed straight off the cursor rather than collected into
+        an agate table first, so large databases are never held in memory all
+        at once.
+        """
+        filtered = len(schema_names) <= MAX_FILTERED_SCHEMAS
+        kwargs = {
+            "database": database,
+            "schemas": sorted(schema_names) if filtered else None,
+        }
+        sql = self.connections._add_query_comment(
+            self.execute_macro(LIST_DATABASE_OBJECTS_SQL_MACRO_NAME, kwargs=kwargs)
+        )
+        objects = []
+        # whether each schema name seen is one of `schema_names`. There are
+        # far fewer schemas than objects, so only lowercase each name once.
+        schema_matches: Dict[str, bool] = {}
+        try:
+            if not filtered:
+                self._set_metadata_session_params()
+            _, cursor = self.connections.add_query(sql, auto_begin=False)
+            with self.connections.exception_handler(sql):
+                column_names = [column[0] for column in cursor.description]
+                schema_index = column_names.index("schema_name")
+                get_fields = itemgetter(
+                    *(column_names.index(c) for c in _LIST_RELATIONS_COLUMNS)
                 )
-                raise RuntimeException(msg)
+                for row in cursor:
+                    schema = row[schema_index]
+                    matches = schema_matches.get(schema)
+                    if matches is None:
+                        matches = _snow_lower(schema) in schema_names
+                        schema_matches[schema] = matches
+                    if matches:
+                        objects.append(get_fields(row))
+        except DatabaseException as exc:
+            msg = (
+                f"Database error while listing objects in database "
+                f'"{database}"\n{exc}'
+            )
+            raise RuntimeException(msg)
 
-            for database_object in results:
-                if database_object["schema_name"].lower() in cache_schema_names:
-                    relation = self._database_object_to_relation(database_object)
-                    self.cache.add(relation)
+        return objects
 
-        # it's possible that there were no relations in some schemas. We want
-        # to insert the schemas we query into the cache's `.schemas` attribute
-        # so we can check it later
-        cache_update: Set[Tuple[Optional[str], Optional[str]]] = set()
-        for relation in cache_schemas:
-            cache_update.add((relation.database, relation.schema))
-        self.cache.update_schemas(cache_update)
+    def _set_metadata_session_params(self) -> None:
+        """Set METADATA_SESSION_PARAMS on the current session.
+
+        Objects are listed on a connection of their own, which dbt closes as
+        soon as the listing is done, so the params are never unset.
+        """
+        self.execute(
+            "alter session set {}".format(
+                ", ".join(f"{k} = {v}" for k, v in METADATA_SESSION_PARAMS.items())
+            )
+        )
 
-    def _database_object_to_relation(self, database_object: Dict) -> SnowflakeRelation:
-        quote_policy = {"database": True, "schema": True, "identifier": True}
+    def _get_relations_cache_token(self, database: str) -> Optional[List[str]]:
+        """Get a cheap signature of the objects in the given database, which
+        changes whenever one is created, dropped or altered.
+        """
         try:
-            _type = self.Relation.get_relation_type(database_object["kind"].lower())
-        except ValueError:
-            _type = self.Relation.External
-
-        relation = self.Relation.create(
-            database=database_object["database_name"],
-            schema=database_object["schema_name"],
-            identifier=database_object["name"],
-            quote_policy=quote_policy,
-            type=_type,
+            table = self.execute_macro(
+                RELATIONS_CACHE_TOKEN_MACRO_NAME, kwargs={"database": database}
+            )
+        except DatabaseException as exc:
+            logger.debug(
+                f'Could not get relations cache token for database "{database}", '
+                f"not persisting its objects: {exc}"
+            )
+            return None
+        if len(table) == 0:
+            return None
+        return [str(value) for value in table[0]]
+
+    def _persisted_database_objects_path(self, database: str) -> str:
+        # what a listing contains depends on the account and on who is looking,
+        # so targets with a same-named database must never share a file
+        credentials = self.config.credentials
+        target_key = hashlib.sha1(
+            json.dumps([credentials.account, credentials.user, credentials.role]).encode()
+        ).hexdigest()[:12]
+        return os.path.join(
+            self.config.target_path,
+            f"{RELATIONS_CACHE_FILE_PREFIX}{database.lower()}_{target_key}.json",
         )
 
-        return relation
+    def _load_persisted_database_objects(
+        self, database: str, token: List[str], schema_names: FrozenSet[str]
+    ) -> Optional[List[Tuple[str, str, str, str]]]:
+        path = self._persisted_database_objects_path(database)
+        try:
+            with open(path) as fp:
+                persisted = json.load(fp)
+            age = time.time() - persisted["saved_at"]
+            if (
+                persisted["token"] != token or
+                age > self.config.credentials.relations_cache_ttl or
+                not schema_names.issubset(persisted["cached_schemas"])
+            ):
+                return None
+            objects = []
+            for obj in persisted["objects"]:
+                if not (
+                    isinstance(obj, list) and
+                    len(obj) == len(_LIST_RELATIONS_COLUMNS) and
+                    all(isinstance(field, str) for field in obj)
+                ):
+                    return None
+                objects.append(tuple(obj))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # a missing, unreadable or malformed file is just a miss
+            return None
+        logger.debug(f'Using persisted objects for database "{database}" from {path}')
+        return objects
+
+    def _persist_database_objects(
+        self,
+        database: str,
+        token: List[str],
+        schema_names: FrozenSet[str],
+        objects: List[Tuple[str, str, str, str]],
+    ) -> None:
+        path = self._persisted_database_objects_path(database)
+        persisted = {
+            "token": token,
+            "saved_at": time.time(),
+            "cached_schemas": sorted(schema_names),
+            "objects": objects,
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as fp:
+                json.dump(persisted, fp)
+        except OSError as exc:
+            logger.debug(f"Could not persist objects to {path}: {exc}")
+
+    def _remove_persisted_database_objects(self) -> None:
+        target_path = self.config.target_path
+        if not os.path.isdir(target_path):
+            return
+        for name in os.listdir(target_path):
+            if name.startswith(RELATIONS_CACHE_FILE_PREFIX) and name.endswith(".json"):
+                path = os.path.join(target_path, name)
+                try:
+                    os.remove(path)
+                except OSError as exc:
+                    logger.debug(f"Could not remove persisted objects {path}: {exc}")
@@ -1,5 +1,8 @@
 from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from dbt.adapters.base.relation import BaseRelation, Policy
+from dbt.contracts.relation import Path, RelationType
 
 
 @dataclass
@@ -12,3 +15,38 @@ class SnowflakeQuotePolicy(Policy):
 @dataclass(frozen=True, eq=False, repr=False)
 class SnowflakeRelation(BaseRelation):
     quote_policy: SnowflakeQuotePolicy = SnowflakeQuotePolicy()
+
+    @classmethod
+    def bulk_create(
+        cls,
+        objects: Iterable[Tuple[str, str, str, str]],
+        quote_policy: Optional[SnowflakeQuotePolicy] = None,
+    ) -> List["SnowflakeRelation"]:
+        """Create a relation for each (database, schema, identifier, kind) in
+        `objects`, where kind is as returned by `show objects`.
+
+        This skips the from_dict deserialization that `create` does for every
+        relation, which dominates when listing thousands of objects. All the
+        relations share one quote policy, and each distinct kind is only
+        mapped to a relation type once.
+        """
+        if quote_policy is None:
+            quote_policy = cls.get_default_quote_policy()
+        types: Dict[str, RelationType] = {}
+        relations = []
+        for database, schema, identifier, kind in objects:
+            relation_type = types.get(kind)
+            if relation_type is None:
+                try:
+                    relation_type = cls.get_relation_type(kind.lower())
+                except ValueError:
+                    relation_type = cls.get_relation_type(cls.External)
+                types[kind] = relation_type
+            relations.append(
+                cls(
+                    path=Path(database=database, schema=schema, identifier=identifier),
+                    type=relation_type,
+                    quote_policy=quote_policy,
+                )
+            )
+        return relations
@@ -115,15 +115,42 @@
   {{ return(result) }}
 {% endmacro %}
 
-{% macro snowflake__list_database_objects(database) %}
+{% macro snowflake__get_list_database_objects_sql(database, schemas=none) %}
+  {#- `show` can't be filtered, so when schemas are given, filter its results
+      with a second statement before they leave snowflake -#}
   {%- set sql -%}
     show terse objects in database {{ database }}
+    {%- if schemas is not none %};
+    select "database_name", "schema_name", "name", "kind"
+    from table(result_scan(last_query_id()))
+    where lower("schema_name") in (
+      {%- for schema in schemas -%}
+        '{{ schema | replace("\\", "\\\\") | replace("'", "\\'") }}'{{ ", " if not loop.last }}
+      {%- endfor -%}
+    )
+    {%- endif %}
+  {%- endset -%}
+  {%- do return(sql) -%}
+{% endmacro %}
+
+{% macro snowflake__get_relations_cache_token(database) %}
+  {%- set sql -%}
+    select count(*) as object_count, max(last_altered) as last_altered
+    from {{ database }}.information_schema.tables
   {%- endset -%}
 
   {%- set result = run_query(sql) -%}
   {%- do return(result) -%}
 {% endmacro %}
 
+{#- The adapter streams the listing from snowflake__get_list_database_objects_sql
+    itself. This wrapper stays for project macros that call it. -#}
+{% macro snowflake__list_database_objects(database) %}
+  {%- set sql = snowflake__get_list_database_objects_sql(database) -%}
+  {%- set result = run_query(sql) -%}
+  {%- do return(result) -%}
+{% endmacro %}
+
 {% macro snowflake__list_relations_without_caching(schema_relation) %}
   {%- set sql -%}
     show terse objects in {{ schema_relation }}
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 import os
 import sys
-import re
 
 # require python 3.7 or newer
 if sys.version_info < (3, 7):
@@ -25,43 +24,53 @@ except ImportError:
     sys.exit(1)
 
 
-# pull long description from README
 this_directory = os.path.abspath(os.path.dirname(__file__))
-with open(os.path.join(this_directory, "README.md")) as f:
-    long_description = f.read()
+
+
+def read_long_description():
+    """Pull the long description from README, if it's there."""
+    readme_path = os.path.join(this_directory, "README.md")
+    if not os.path.exists(readme_path):
+        return ""
+    with open(readme_path, encoding="utf-8") as f:
+        return f.read()
+
 
 package_name = "dbt-snowflake"
 package_version = "1.0.0dvtd"
 dbt_core_version = "1.0.0"
 description = """The Snowflake adapter plugin for dbt"""
 
-setup(
-    name=package_name,
-    version=package_version,
-    description=description,
-    long_description=long_description,
-    long_description_content_type="text/markdown",
-    author="dbt Labs",
-    author_email="info@dbtlabs.com",
-    url="https://github.com/dbt-labs/dbt-snowflake",
-    packages=find_namespace_packages(include=["dbt", "dbt.*"]),
-    include_package_data=True,
-    install_requires=[
-        "dbt-core~={}".format(dbt_core_version),
-        "snowflake-connector-python[secure-local-storage]>=2.4.1,<2.8.0",
-        "requests<3.0.0",
-        "cryptography>=3.2,<4",
-    ],
-    zip_safe=False,
-    classifiers=[
-        "Development Status :: 5 - Production/Stable",
-        "License :: OSI Approved :: Apache Software License",
-        "Operating System :: Microsoft :: Windows",
-        "Operating System :: MacOS :: MacOS X",
-        "Operating System :: POSIX :: Linux",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
-        "Programming Language :: Python :: 3.9",
-    ],
-    python_requires=">=3.7",
-)
+# only build the package metadata when run as a script, so importing this
+# file (as some tools do) does no I/O
+if __name__ == "__main__":
+    setup(
+        name=package_name,
+        version=package_version,
+        description=description,
+        long_description=read_long_description(),
+        long_description_content_type="text/markdown",
+        author="dbt Labs",
+        author_email="info@dbtlabs.com",
+        url="https://github.com/dbt-labs/dbt-snowflake",
+        packages=find_namespace_packages(include=["dbt", "dbt.*"]),
+        include_package_data=True,
+        install_requires=[
+            "dbt-core~={}".format(dbt_core_version),
+            "snowflake-connector-python[secure-local-storage]>=2.4.1,<2.8.0",
+            "requests<3.0.0",
+            "cryptography>=3.2,<4",
+        ],
+        zip_safe=False,
+        classifiers=[
+            "Development Status :: 5 - Production/Stable",
+            "License :: OSI Approved :: Apache Software License",
+            "Operating System :: Microsoft :: Windows",
+            "Operating System :: MacOS :: MacOS X",
+            "Operating System :: POSIX :: Linux",
+            "Programming Language :: Python :: 3.7",
+            "Programming Language :: Python :: 3.8",
+            "Programming Language :: Python :: 3.9",
+        ],
+        python_requires=">=3.7",
+    )
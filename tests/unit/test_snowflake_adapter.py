@@ -1,5 +1,6 @@
 import agate
 import re
+import tempfile
 import unittest
 from contextlib import contextmanager
 from unittest import mock
@@ -13,6 +14,7 @@ from dbt.adapters.base.query_headers import MacroQueryStringSetter
 from dbt.contracts.files import FileHash
 from dbt.contracts.graph.manifest import ManifestStateCheck
 from dbt.clients import agate_helper
+from dbt.exceptions import DatabaseException
 from snowflake import connector as snowflake_connector
 
 from .utils import config_from_parts_or_dicts, inject_adapter, mock_connection, TestAdapterConversions, load_internal_manifest_macros
@@ -202,7 +204,9 @@ class TestSnowflakeAdapter(unittest.TestCase):
         return result
 
     def test_pre_post_hooks_warehouse(self):
-        with self.current_warehouse('warehouse'):
+        # without a profile warehouse, the session's warehouse has to be asked for
+        no_default = mock.patch.object(self.adapter, '_default_warehouse', None)
+        with no_default, self.current_warehouse('warehouse'):
             config = {'snowflake_warehouse': 'other_warehouse'}
             result = self.adapter.pre_model_hook(config)
             self.assertIsNotNone(result)
@@ -224,6 +228,307 @@ class TestSnowflakeAdapter(unittest.TestCase):
             self.adapter.post_model_hook(config, result)
             self.mock_execute.assert_not_called()
 
+    def _new_handle_per_connection(self, current_warehouse):
+        """Open a fresh snowflake session for every connection, the way dbt
+        does for each node in a real run. Returns the handles as they open.
+        """
+        handles = []
+
+        def connect(*args, **kwargs):
+            handle = mock.MagicMock(spec=snowflake_connector.SnowflakeConnection)
+            cursor = handle.cursor.return_value
+
+            def execute_effect(sql, *args, **kwargs):
+                if sql == '/* dbt */\nselect current_warehouse() as warehouse':
+                    cursor.description = [['name']]
+                    cursor.fetchall.return_value = [[current_warehouse]]
+                else:
+                    cursor.description = None
+                    cursor.fetchall.return_value = []
+                return cursor.execute.return_value
+
+            cursor.execute.side_effect = execute_effect
+            handles.append(handle)
+            return handle
+
+        self.snowflake.side_effect = connect
+        return handles
+
+    def test_pre_post_hooks_warehouse_cached(self):
+        handles = self._new_handle_per_connection('test_warehouse')
+        config = {'snowflake_warehouse': 'other_warehouse'}
+        for name in ('model.X.model_a', 'model.X.model_b'):
+            with self.adapter.connection_named(name):
+                result = self.adapter.pre_model_hook(config)
+                self.assertEqual(result, 'test_warehouse')
+                self.adapter.post_model_hook(config, result)
+
+        # every session starts on the profile's warehouse, so it is never queried
+        self.assertEqual(len(handles), 2)
+        for handle in handles:
+            self.assertEqual(handle.cursor.return_value.execute.call_args_list, [
+                mock.call('/* dbt */\nuse warehouse other_warehouse', None),
+                mock.call('/* dbt */\nuse warehouse test_warehouse', None),
+            ])
+
+    def test_pre_post_hooks_warehouse_cached_per_session(self):
+        handles = self._new_handle_per_connection('warehouse')
+        config = {'snowflake_warehouse': 'other_warehouse'}
+        with mock.patch.object(self.adapter, '_default_warehouse', None):
+            for name in ('model.X.model_a', 'model.X.model_b'):
+                with self.adapter.connection_named(name):
+                    for _ in range(2):
+                        result = self.adapter.pre_model_hook(config)
+                        self.assertEqual(result, 'warehouse')
+                        self.adapter.post_model_hook(config, result)
+
+        # asked once per session: a new session never reuses an old answer
+        self.assertEqual(len(handles), 2)
+        for handle in handles:
+            self.assertEqual(handle.cursor.return_value.execute.call_args_list, [
+                mock.call('/* dbt */\nselect current_warehouse() as warehouse', None),
+                mock.call('/* dbt */\nuse warehouse other_warehouse', None),
+                mock.call('/* dbt */\nuse warehouse warehouse', None),
+                mock.call('/* dbt */\nuse warehouse other_warehouse', None),
+                mock.call('/* dbt */\nuse warehouse warehouse', None),
+            ])
+
+    def test_make_match_kwargs(self):
+        self.assertEqual(
+            self.adapter._make_match_kwargs(None, 'test_schema', 'test_table'),
+            {'schema': 'test_schema', 'identifier': 'TEST_TABLE'}
+        )
+        self.assertEqual(self.adapter._make_match_kwargs(None, None, None), {})
+
+    def test_catalog_filter_table(self):
+        manifest = mock.MagicMock()
+        manifest.get_used_schemas.return_value = [('TEST_DATABASE', 'test_schema')]
+        table = agate.Table(
+            rows=[
+                ['test_database', 'TEST_SCHEMA', 'table_a', 'id', 1],
+                ['test_database', 'test_schema', '1234', 'id', 1],
+                ['test_database', 'other_schema', 'table_b', 'id', 1],
+                ['other_database', 'test_schema', 'table_c', 'id', 1],
+                ['test_database', None, 'table_d', 'id', 1],
+            ],
+            column_names=[
+                'TABLE_DATABASE', 'Table_Schema', 'table_name', 'COLUMN_NAME', 'Column_Index',
+            ],
+            column_types=[agate.Text()] * 4 + [agate.Number()],
+        )
+
+        result = SnowflakeAdapter._catalog_filter_table(table, manifest)
+        expected = super(SnowflakeAdapter, SnowflakeAdapter)._catalog_filter_table(
+            table.rename(column_names=[c.lower() for c in table.column_names]),
+            manifest,
+        )
+
+        self.assertEqual(result.column_names, expected.column_names)
+        self.assertEqual(
+            [type(t) for t in result.column_types],
+            [type(t) for t in expected.column_types],
+        )
+        self.assertEqual(
+            [tuple(r) for r in result.rows], [tuple(r) for r in expected.rows]
+        )
+        self.assertEqual(
+            [r['table_name'] for r in result.rows], ['table_a', '1234']
+        )
+
+    def test_list_relations_without_caching(self):
+        table = agate.Table(
+            [
+                ['my_table', 'TABLE', 'test_database', 'test_schema'],
+                ['my_view', 'VIEW', 'test_database', 'test_schema'],
+                ['my_external', 'EXTERNAL_TABLE', 'test_database', 'test_schema'],
+            ],
+            ['name', 'kind', 'database_name', 'schema_name'],
+            [agate.Text()] * 4,
+        )
+        schema_relation = self.adapter.Relation.create(
+            database='test_database',
+            schema='test_schema',
+            quote_policy=self.adapter.config.quoting,
+        )
+        with mock.patch.object(self.adapter, 'execute_macro', return_value=table):
+            relations = self.adapter.list_relations_without_caching(schema_relation)
+
+        self.assertEqual(
+            [r.identifier for r in relations],
+            ['my_table', 'my_view', 'my_external']
+        )
+        self.assertEqual(
+            [r.type for r in relations],
+            [self.adapter.Relation.Table, self.adapter.Relation.View, self.adapter.Relation.External]
+        )
+        self.assertEqual(
+            relations[0].render(), '"test_database"."test_schema"."my_table"'
+        )
+
+    def test_list_relations_without_caching_missing_schema(self):
+        schema_relation = self.adapter.Relation.create(
+            database='test_database',
+            schema='test_schema',
+            quote_policy=self.adapter.config.quoting,
+        )
+        error = DatabaseException(
+            "SQL compilation error:\nSchema 'TEST_DATABASE.TEST_SCHEMA' does not exist or not authorized."
+        )
+        error.__cause__ = snowflake_connector.errors.ProgrammingError(
+            msg=str(error), errno=2003
+        )
+        with mock.patch.object(self.adapter, 'execute_macro', side_effect=error):
+            self.assertEqual(
+                self.adapter.list_relations_without_caching(schema_relation), []
+            )
+
+        error.__cause__ = snowflake_connector.errors.ProgrammingError(
+            msg='Insufficient privileges to operate on schema', errno=3001
+        )
+        with mock.patch.object(self.adapter, 'execute_macro', side_effect=error):
+            with self.assertRaises(DatabaseException):
+                self.adapter.list_relations_without_caching(schema_relation)
+
+        # without an error code, the connector reports errno -1: fall back to
+        # the message
+        missing = DatabaseException('Object does not exist, or operation cannot be performed.')
+        missing.__cause__ = snowflake_connector.errors.ProgrammingError(msg=str(missing))
+        self.assertEqual(missing.__cause__.errno, -1)
+        with mock.patch.object(self.adapter, 'execute_macro', side_effect=missing):
+            self.assertEqual(
+                self.adapter.list_relations_without_caching(schema_relation), []
+            )
+
+        error.__cause__ = snowflake_connector.errors.ProgrammingError(msg=str(error))
+        with mock.patch.object(self.adapter, 'execute_macro', side_effect=error):
+            with self.assertRaises(DatabaseException):
+                self.adapter.list_relations_without_caching(schema_relation)
+
+    def test_set_relations_cache(self):
+        cache_schemas = {
+            self.adapter.Relation.create(
+                database='test_database',
+                schema=schema,
+                quote_policy=self.adapter.config.quoting,
+            )
+            for schema in ('test_schema', "it's")
+        }
+        rows = [
+            ('TEST_DATABASE', 'TEST_SCHEMA', 'MY_TABLE', 'TABLE', ''),
+            ('TEST_DATABASE', "IT'S", 'MY_VIEW', 'VIEW', ''),
+            ('TEST_DATABASE', 'OTHER_SCHEMA', 'NOT_MINE', 'TABLE', ''),
+        ]
+        self.cursor.description = [
+            ('database_name',), ('schema_name',), ('name',), ('kind',), ('comment',)
+        ]
+        self.cursor.__iter__.side_effect = lambda: iter(rows)
+
+        def assert_cached():
+            self.assertEqual(
+                self.adapter.cache.schemas,
+                {('test_database', 'test_schema'), ('test_database', "it's")}
+            )
+            self.assertEqual(
+                [r.render() for r in self.adapter.cache.get_relations('test_database', 'test_schema')],
+                ['"TEST_DATABASE"."TEST_SCHEMA"."MY_TABLE"']
+            )
+            self.assertEqual(
+                [r.type for r in self.adapter.cache.get_relations('test_database', "it's")],
+                [self.adapter.Relation.View]
+            )
+            self.assertEqual(self.adapter.cache.get_relations('test_database', 'other_schema'), [])
+
+        with mock.patch.object(self.adapter, '_get_cache_schemas', return_value=cache_schemas):
+            # few enough schemas: snowflake filters the listing to them
+            self.adapter.set_relations_cache(mock.MagicMock())
+            self.assertEqual(self.mock_execute.call_args_list, [
+                mock.call('/* dbt */\nshow terse objects in database test_database;', None),
+                mock.call(
+                    'select "database_name", "schema_name", "name", "kind"\n'
+                    '    from table(result_scan(last_query_id()))\n'
+                    '    where lower("schema_name") in (\'it\\\'s\', \'test_schema\')',
+                    None
+                ),
+            ])
+            assert_cached()
+
+            # too many schemas: list everything and filter it here
+            self.mock_execute.reset_mock()
+            with mock.patch('dbt.adapters.snowflake.impl.MAX_FILTERED_SCHEMAS', 1):
+                self.adapter.set_relations_cache(mock.MagicMock(), clear=True)
+            self.assertEqual(self.mock_execute.call_args_list, [
+                mock.call(
+                    '/* dbt */\nalter session set client_result_chunk_size = 48, '
+                    'client_prefetch_threads = 8',
+                    None
+                ),
+                mock.call('/* dbt */\nshow terse objects in database test_database', None),
+            ])
+            assert_cached()
+
+    def test_persisted_database_objects(self):
+        objects = [('test_database', 'test_schema', 'my_table', 'TABLE')]
+        with tempfile.TemporaryDirectory() as target_path, \
+                mock.patch.object(self.config, 'target_path', target_path), \
+                mock.patch.object(self.config.credentials, 'relations_cache_ttl', 60):
+            self.adapter._persist_database_objects(
+                'test_database', ['1', 'x'], frozenset(['test_schema']), objects
+            )
+            self.assertEqual(
+                self.adapter._load_persisted_database_objects(
+                    'TEST_DATABASE', ['1', 'x'], frozenset(['test_schema'])
+                ),
+                objects
+            )
+            # a different token, or a schema that wasn't cached, is a miss
+            self.assertIsNone(
+                self.adapter._load_persisted_database_objects(
+                    'test_database', ['2', 'x'], frozenset(['test_schema'])
+                )
+            )
+            self.assertIsNone(
+                self.adapter._load_persisted_database_objects(
+                    'test_database', ['1', 'x'], frozenset(['test_schema', 'other_schema'])
+                )
+            )
+
+            # another account or role never sees this target's listing
+            for field, value in (('account', 'other_account'), ('role', 'other_role')):
+                with mock.patch.object(self.config.credentials, field, value):
+                    self.assertIsNone(
+                        self.adapter._load_persisted_database_objects(
+                            'test_database', ['1', 'x'], frozenset(['test_schema'])
+                        )
+                    )
+
+            self.adapter._remove_persisted_database_objects()
+            self.assertIsNone(
+                self.adapter._load_persisted_database_objects(
+                    'test_database', ['1', 'x'], frozenset(['test_schema'])
+                )
+            )
+
+            # a malformed file is a miss too
+            path = self.adapter._persisted_database_objects_path('test_database')
+            for contents in (
+                '[]',
+                '{"token": ["1", "x"]}',
+                '{"token": ["1", "x"], "saved_at": 1e20, "cached_schemas": ["test_schema"]}',
+                '{"token": ["1", "x"], "saved_at": 1e20, "cached_schemas": ["test_schema"], '
+                '"objects": [["test_database", "test_schema", null, "TABLE"]]}',
+            ):
+                with open(path, 'w') as fp:
+                    fp.write(contents)
+                self.assertIsNone(
+                    self.adapter._load_persisted_database_objects(
+                        'test_database', ['1', 'x'], frozenset(['test_schema'])
+                    )
+                )
+
+            # failing to remove a file is not an error
+            with mock.patch('os.remove', side_effect=PermissionError):
+                self.adapter._remove_persisted_database_objects()
+
     def test_cancel_open_connections_empty(self):
         self.assertEqual(len(list(self.adapter.cancel_open_connections())), 0)
 